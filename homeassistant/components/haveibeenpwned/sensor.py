@@ -1,37 +1,69 @@
 """Support for haveibeenpwned (email breaches) sensor."""
 from __future__ import annotations
 
+import asyncio
 from datetime import timedelta
+import hashlib
 from http import HTTPStatus
 import logging
-
-from aiohttp.hdrs import USER_AGENT
-import requests
+from operator import itemgetter
+from types import MappingProxyType
+from urllib.parse import quote
+
+import aiohttp
+from aiohttp.hdrs import (
+    CONTENT_LENGTH,
+    ETAG,
+    IF_MODIFIED_SINCE,
+    IF_NONE_MATCH,
+    LAST_MODIFIED,
+    USER_AGENT,
+)
+import ijson
+import orjson
 import voluptuous as vol
 
 from homeassistant.components.sensor import PLATFORM_SCHEMA, SensorEntity
 from homeassistant.const import ATTR_ATTRIBUTION, CONF_API_KEY, CONF_EMAIL
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.event import track_point_in_time
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
-from homeassistant.util import Throttle
+from homeassistant.helpers.update_coordinator import (
+    CoordinatorEntity,
+    DataUpdateCoordinator,
+)
 import homeassistant.util.dt as dt_util
-import json
 
 _LOGGER = logging.getLogger(__name__)
 
+DOMAIN = "haveibeenpwned"
+
 ATTRIBUTION = "Data provided by Have I Been Pwned (HIBP)"
 
 DATE_STR_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 HA_USER_AGENT = "Home Assistant HaveIBeenPwned Sensor Component"
 
-MIN_TIME_BETWEEN_FORCED_UPDATES = timedelta(seconds=5)
-MIN_TIME_BETWEEN_UPDATES = timedelta(minutes=15)
+SCAN_INTERVAL = timedelta(minutes=15)
+
+STORAGE_KEY = DOMAIN
+STORAGE_SAVE_DELAY = 10
+STORAGE_VERSION = 1
 
 URL = "https://haveibeenpwned.com/api/v3/breachedaccount/"
+BREACHES_URL = "https://haveibeenpwned.com/api/v3/breaches"
+DOMAIN_URL = "https://haveibeenpwned.com/api/v3/breacheddomain/"
+
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=5)
+
+# Responses larger than this are stream-parsed instead of materialized;
+# below it the one-shot orjson parse is faster
+STREAM_PARSE_THRESHOLD = 128 * 1024
+
+_PARAMS = MappingProxyType({"truncateResponse": "false"})
 
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
     {
@@ -40,188 +72,370 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
     }
 )
 
+BreachData = tuple[tuple[str, ...], tuple[str, ...]]
+
+
+def _build_breach_data(records):
+    """Sort (AddedDate, Title) records and build the stored tuples."""
+    # AddedDate is ISO-8601, which sorts lexicographically in
+    # chronological order, so no datetime parsing is needed here
+    records.sort(key=itemgetter(0), reverse=True)
+    titles = tuple(title for _, title in records)
+    dates = tuple(
+        dt_util.as_local(dt_util.parse_datetime(added)).strftime(DATE_STR_FORMAT)
+        for added, _ in records
+    )
+    return (titles, dates)
+
 
-def setup_platform(
+async def async_setup_platform(
     hass: HomeAssistant,
     config: ConfigType,
-    add_entities: AddEntitiesCallback,
+    async_add_entities: AddEntitiesCallback,
     discovery_info: DiscoveryInfoType | None = None,
 ) -> None:
     """Set up the HaveIBeenPwned sensor."""
     emails = config[CONF_EMAIL]
     api_key = config[CONF_API_KEY]
-    data = HaveIBeenPwnedData(emails, api_key)
+    session = async_get_clientsession(hass)
+    coordinator = HaveIBeenPwnedDataUpdateCoordinator(hass, emails, api_key, session)
+    await coordinator.async_refresh()
 
-    devices = []
-    for email in emails:
-        devices.append(HaveIBeenPwnedSensor(data, email))
+    async_add_entities(HaveIBeenPwnedSensor(coordinator, email) for email in emails)
 
-    add_entities(devices)
 
-
-class HaveIBeenPwnedSensor(SensorEntity):
+class HaveIBeenPwnedSensor(
+    CoordinatorEntity["HaveIBeenPwnedDataUpdateCoordinator"], SensorEntity
+):
     """Implementation of a HaveIBeenPwned sensor."""
 
-    def __init__(self, data, email):
+    _attr_native_unit_of_measurement = "Breaches"
+
+    def __init__(self, coordinator, email):
         """Initialize the HaveIBeenPwned sensor."""
-        self._state = None
-        self._data = data
+        super().__init__(coordinator)
         self._email = email
-        self._unit_of_measurement = "Breaches"
-
-    @property
-    def name(self):
-        """Return the name of the sensor."""
-        return f"Breaches {self._email}"
-
-    @property
-    def native_unit_of_measurement(self):
-        """Return the unit the value is expressed in."""
-        return self._unit_of_measurement
+        self._attr_name = f"Breaches {email}"
+        self._attr_extra_state_attributes = {ATTR_ATTRIBUTION: ATTRIBUTION}
+        if coordinator.data and email in coordinator.data:
+            self._update_attributes()
 
     @property
     def native_value(self):
         """Return the state of the device."""
-        return self._state
-
-    @property
-    def extra_state_attributes(self):
-        """Return the attributes of the sensor."""
-        val = {ATTR_ATTRIBUTION: ATTRIBUTION}
-        if self._email not in self._data.data:
-            return val
-
-        for idx, value in enumerate(self._data.data[self._email]):
-            tmpname = f"breach {idx + 1}"
-            datetime_local = dt_util.as_local(
-                dt_util.parse_datetime(value["AddedDate"])
+        if (breaches := self.coordinator.data.get(self._email)) is None:
+            return None
+        return len(breaches[0])
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
+        if self._email in self.coordinator.data:
+            self._update_attributes()
+        super()._handle_coordinator_update()
+
+    def _update_attributes(self):
+        """Rebuild the cached attributes from the latest breach data."""
+        attrs = self._attr_extra_state_attributes
+        attrs.clear()
+        attrs[ATTR_ATTRIBUTION] = ATTRIBUTION
+        titles, dates = self.coordinator.data[self._email]
+        for idx, (title, date) in enumerate(zip(titles, dates)):
+            attrs[f"breach {idx + 1}"] = f"{title} {date}"
+
+
+class HaveIBeenPwnedDataUpdateCoordinator(DataUpdateCoordinator[dict[str, BreachData]]):
+    """Coordinator handling the data retrieval for all configured emails."""
+
+    def __init__(self, hass, emails, api_key, session):
+        """Initialize the coordinator."""
+        super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=SCAN_INTERVAL)
+        self._session = session
+        # Key the store by the configured emails so multiple platform
+        # entries (e.g. with separate API keys) don't overwrite each
+        # other's cache file
+        config_hash = hashlib.sha256("|".join(sorted(emails)).encode()).hexdigest()[:8]
+        self._store = Store(hass, STORAGE_VERSION, f"{STORAGE_KEY}.{config_hash}")
+        self._cache = None
+        self._emails = emails
+        # Percent-encode the emails so addresses with characters like "+"
+        # don't make HIBP answer with a redirect
+        self._urls = {email: f"{URL}{quote(email, safe='')}" for email in emails}
+        self._headers = {
+            USER_AGENT: HA_USER_AGENT,
+            "hibp-api-key": api_key,
+        }
+        self._etags = {}
+        self._last_modified = {}
+        # When every address is on one domain, a single subscribed-domain
+        # request can replace the per-email lookups
+        domains = {email.rpartition("@")[2] for email in emails}
+        self._domain = domains.pop() if len(domains) == 1 else None
+        self._breach_catalog = None
+        # HIBP rate limits per API key, so serialize the requests while
+        # still sharing the connection across them
+        self._semaphore = asyncio.Semaphore(1)
+
+    async def _async_update_data(self):
+        """Get the latest data for all emails from the REST service."""
+        if self._cache is None:
+            self._cache = await self._store.async_load() or {}
+        data = dict(self.data) if self.data else {}
+        # One subscribed-domain request covers every configured email, so
+        # try that before falling back to a request per email
+        if self._domain is not None and await self._fetch_domain(data):
+            return data
+        # return_exceptions keeps one malformed response from discarding
+        # the other emails' results with it
+        results = await asyncio.gather(
+            *(self._fetch(data, email) for email in self._emails),
+            return_exceptions=True,
+        )
+        for email, result in zip(self._emails, results):
+            if isinstance(result, Exception):
+                _LOGGER.error(
+                    "Unexpected error fetching data for %s: %s", email, result
+                )
+        return data
+
+    def _cache_get(self, email, max_age=None):
+        """Return cached (titles, dates) for an email, or None."""
+        if (cached := self._cache.get(email)) is None:
+            return None
+        if (
+            max_age is not None
+            and dt_util.utcnow().timestamp() - cached["timestamp"] > max_age
+        ):
+            return None
+        return (tuple(cached["titles"]), tuple(cached["dates"]))
+
+    def _cache_set(self, email, titles, dates):
+        """Store (titles, dates) for an email and schedule a save."""
+        self._cache[email] = {
+            "timestamp": dt_util.utcnow().timestamp(),
+            "titles": list(titles),
+            "dates": list(dates),
+        }
+        self._store.async_delay_save(lambda: self._cache, STORAGE_SAVE_DELAY)
+
+    async def _fetch_domain(self, data):
+        """Fetch breach data for every email via one subscribed-domain call.
+
+        Returns True if the domain endpoint could be used, so the caller
+        knows whether to fall back to per-email lookups.
+        """
+        # A fresh cache for every email (typically right after a restart)
+        # makes any request unnecessary
+        all_fresh = True
+        for email in self._emails:
+            if (
+                cached := self._cache_get(email, max_age=SCAN_INTERVAL.total_seconds())
+            ) is not None:
+                data[email] = cached
+            else:
+                all_fresh = False
+        if all_fresh:
+            _LOGGER.debug("Using cached data for all emails")
+            return True
+
+        _LOGGER.debug("Checking for breaches for domain: %s", self._domain)
+        try:
+            async with self._semaphore, self._session.get(
+                f"{DOMAIN_URL}{self._domain}",
+                headers=self._headers,
+                allow_redirects=False,
+                timeout=REQUEST_TIMEOUT,
+            ) as req:
+                status = req.status
+                content = await req.read()
+
+        except (asyncio.TimeoutError, aiohttp.ClientError):
+            _LOGGER.error("Failed fetching domain data for %s", self._domain)
+            return False
+
+        if status != HTTPStatus.OK:
+            _LOGGER.debug(
+                "Domain endpoint unavailable for %s (HTTP Status_code = %d)",
+                self._domain,
+                status,
             )
-            tmpvalue = f"{value['Title']} {datetime_local.strftime(DATE_STR_FORMAT)}"
-            val[tmpname] = tmpvalue
-
-        return val
-
-    async def async_added_to_hass(self):
-        """Get initial data."""
-        # To make sure we get initial data for the sensors ignoring the normal
-        # throttle of 15 minutes but using an update throttle of 5 seconds
-        self.hass.async_add_executor_job(self.update_nothrottle)
-
-    def update_nothrottle(self, dummy=None):
-        """Update sensor without throttle."""
-        self._data.update_no_throttle()
-
-        # Schedule a forced update 5 seconds in the future if the update above
-        # returned no data for this sensors email. This is mainly to make sure
-        # that we don't get HTTP Error "too many requests" and to have initial
-        # data after hass startup once we have the data it will update as
-        # normal using update
-        if self._email not in self._data.data:
-            track_point_in_time(
-                self.hass,
-                self.update_nothrottle,
-                dt_util.now() + MIN_TIME_BETWEEN_FORCED_UPDATES,
+            if status in (
+                HTTPStatus.UNAUTHORIZED,
+                HTTPStatus.FORBIDDEN,
+                HTTPStatus.NOT_FOUND,
+            ):
+                # The domain is not subscribed/verified for this API key;
+                # disable the domain path and use per-email lookups. On
+                # transient errors (429, 5xx) the endpoint is retried
+                # next poll
+                self._domain = None
+            return False
+
+        if (catalog := await self._async_get_breach_catalog()) is None:
+            return False
+
+        breached = orjson.loads(content)
+        for email in self._emails:
+            alias = email.partition("@")[0]
+            records = [
+                catalog[name] for name in breached.get(alias) or () if name in catalog
+            ]
+            titles, dates = _build_breach_data(records)
+            data[email] = (titles, dates)
+            self._cache_set(email, titles, dates)
+        return True
+
+    async def _async_get_breach_catalog(self):
+        """Fetch the catalog of all known breaches, keyed by breach name.
+
+        The domain endpoint only returns breach names, so the catalog
+        supplies the Title and AddedDate; it rarely changes and is kept
+        for the process lifetime.
+        """
+        if self._breach_catalog is not None:
+            return self._breach_catalog
+        try:
+            async with self._semaphore, self._session.get(
+                BREACHES_URL,
+                headers=self._headers,
+                allow_redirects=False,
+                timeout=REQUEST_TIMEOUT,
+            ) as req:
+                status = req.status
+                content = await req.read()
+
+        except (asyncio.TimeoutError, aiohttp.ClientError):
+            _LOGGER.error("Failed fetching the breach catalog")
+            return None
+
+        if status != HTTPStatus.OK:
+            _LOGGER.error(
+                "Failed fetching the breach catalog (HTTP Status_code = %d)", status
             )
-            return
-        self._state = len(self._data.data[self._email])
-        self.schedule_update_ha_state()
-
-    def update(self):
-        """Update data and see if it contains data for our email."""
-        self._data.update()
-
-        if self._email in self._data.data:
-            self._state = len(self._data.data[self._email])
+            return None
 
+        self._breach_catalog = {
+            breach["Name"]: (breach["AddedDate"], breach["Title"])
+            for breach in orjson.loads(content)
+        }
+        return self._breach_catalog
 
-class HaveIBeenPwnedData:
-    """Class for handling the data retrieval."""
-
-    def __init__(self, emails, api_key):
-        """Initialize the data object."""
+    async def _fetch(self, data, email):
+        """Get the latest data for one email from the REST service."""
         _LOGGER.debug(
-            "Instantiating HaveIBeenPwnedData class and initializing the data object"
-        )
-        self._email_count = len(emails)
-        self._current_index = 0
-        self.data = {}
-        self._email = emails[0]
-        self._emails = emails
-        self._api_key = api_key
-
-    def set_next_email(self):
-        """Set the next email to be looked up."""
-        _LOGGER.debug("Setting the next email to look up email: %s", self._email)
-        self._current_index = (self._current_index + 1) % self._email_count
-        self._email = self._emails[self._current_index]
-
-    def update_no_throttle(self):
-        """Get the data for a specific email."""
-        _LOGGER.debug("Getting data for a specific email: %s", self._email)
-        self.update(no_throttle=True)
-
-    @Throttle(MIN_TIME_BETWEEN_UPDATES, MIN_TIME_BETWEEN_FORCED_UPDATES)
-    def update(self, **kwargs):
-        """Get the latest data for current email from REST service."""
-        _LOGGER.debug(
-            "Getting the latest data for the current email from the REST service for email: %s",
-            self._email,
+            "Getting the latest data from the REST service for email: %s", email
         )
+        # A fresh cached payload (typically from before a restart) saves
+        # both the HTTP round trip and a hit on the API-key rate limit
+        if (
+            cached := self._cache_get(email, max_age=SCAN_INTERVAL.total_seconds())
+        ) is not None:
+            _LOGGER.debug("Using cached data for %s", email)
+            data[email] = cached
+            return
+
+        url = self._urls[email]
+        headers = self._headers
+        # A conditional request lets the server answer 304 with an empty
+        # body when nothing changed, skipping the body transfer and parse
+        if (etag := self._etags.get(email)) is not None:
+            headers = {**headers, IF_NONE_MATCH: etag}
+        if (last_modified := self._last_modified.get(email)) is not None:
+            headers = {**headers, IF_MODIFIED_SINCE: last_modified}
+        _LOGGER.debug("Checking for breaches for email: %s", email)
         try:
-            url = f"{URL}{self._email}"
-            paramspayload = {"truncateResponse": "false"}
-            header = {
-                "USER_AGENT": HA_USER_AGENT,
-                "hibp-api-key": self._api_key,
-            }
-            _LOGGER.debug("Checking for breaches for email: %s", self._email)
-            req = requests.get(
+            async with self._semaphore, self._session.get(
                 url,
-                params=paramspayload,
-                headers=header,
-                allow_redirects=True,
-                timeout=5,
-            )
-            _LOGGER.debug("Requested URL is %s", url)
-            _LOGGER.debug("Request object URL is %s", req.request.url)
-            _LOGGER.debug("Request headers are %s", req.request.headers)
-
-        except requests.exceptions.RequestException:
-            _LOGGER.error("Failed fetching data for %s", self._email)
-            _LOGGER.debug("Response was %s", req.text)
+                params=_PARAMS,
+                headers=headers,
+                allow_redirects=False,
+                timeout=REQUEST_TIMEOUT,
+            ) as req:
+                status = req.status
+                response_etag = req.headers.get(ETAG)
+                response_last_modified = req.headers.get(LAST_MODIFIED)
+                content = b""
+                records = None
+                if (
+                    status == HTTPStatus.OK
+                    and int(req.headers.get(CONTENT_LENGTH) or 0)
+                    > STREAM_PARSE_THRESHOLD
+                ):
+                    # Stream-parse large breach lists so the full JSON
+                    # tree is never resident; keep only the two fields
+                    # that are actually used
+                    records = [
+                        (item["AddedDate"], item["Title"])
+                        async for item in ijson.items_async(req.content, "item")
+                    ]
+                else:
+                    content = await req.read()
+                if _LOGGER.isEnabledFor(logging.DEBUG):
+                    _LOGGER.debug("Requested URL is %s", url)
+                    _LOGGER.debug("Request object URL is %s", req.url)
+                    _LOGGER.debug("Request headers are %s", req.request_info.headers)
+
+        except (asyncio.TimeoutError, aiohttp.ClientError):
+            _LOGGER.error("Failed fetching data for %s", email)
+            self._serve_stale(data, email)
             return
 
-        if req.status_code == HTTPStatus.OK:
-            _LOGGER.debug("HTTP Status OK fetching data for %s", self._email)
-            _LOGGER.debug("Response: %s", req.text)
-            json_object = req.json()
-            json_formatted_str = json.dumps(json_object, indent=2)
-            _LOGGER.debug("The returned JSON data: %s", json_formatted_str)
-            _LOGGER.debug("The returned text data: %s", req.text)
-            self.data[self._email] = sorted(
-                req.json(), key=lambda k: k["AddedDate"], reverse=True
+        if status == HTTPStatus.OK:
+            if records is None:
+                json_object = orjson.loads(content)
+                if _LOGGER.isEnabledFor(logging.DEBUG):
+                    _LOGGER.debug("HTTP Status OK fetching data for %s", email)
+                    json_formatted_str = orjson.dumps(
+                        json_object, option=orjson.OPT_INDENT_2
+                    ).decode()
+                    _LOGGER.debug("The returned JSON data: %s", json_formatted_str)
+                    _LOGGER.debug("Response: %s", content)
+                # Only Title and AddedDate are exposed as attributes, so keep
+                # (date, title) pairs instead of the full 20-field dicts
+                records = [
+                    (breach["AddedDate"], breach["Title"]) for breach in json_object
+                ]
+            titles, dates = _build_breach_data(records)
+            data[email] = (titles, dates)
+            self._cache_set(email, titles, dates)
+            if response_etag is not None:
+                self._etags[email] = response_etag
+            if response_last_modified is not None:
+                self._last_modified[email] = response_last_modified
+
+        elif status == HTTPStatus.NOT_MODIFIED:
+            _LOGGER.debug("HTTP Status Not Modified, data unchanged for %s", email)
+            self._serve_stale(data, email)
+
+        elif status == HTTPStatus.NOT_FOUND:
+            _LOGGER.debug("HTTP Status Not Found fetching data for %s", email)
+            data[email] = ((), ())
+            self._cache_set(email, (), ())
+
+        elif HTTPStatus.MULTIPLE_CHOICES <= status < HTTPStatus.BAD_REQUEST:
+            # Following a redirect would silently double every poll's
+            # round trips; fail loudly so the URL gets fixed instead
+            _LOGGER.error(
+                "Unexpected redirect fetching data for %s (HTTP Status_code = %d), not following it",
+                email,
+                status,
             )
-
-            # Only goto next email if we had data so that
-            # the forced updates try this current email again
-            _LOGGER.debug("Setting to the next email: %s", self._email)
-            self.set_next_email()
-
-        elif req.status_code == HTTPStatus.NOT_FOUND:
-            _LOGGER.debug("HTTP Status Not Found fetching data for %s", self._email)
-            self.data[self._email] = []
-
-            # only goto next email if we had data so that
-            # the forced updates try this current email again
-            self.set_next_email()
+            self._serve_stale(data, email)
 
         else:
-            _LOGGER.debug(
-                "An unhandled error occurred fetching data for %s", self._email
-            )
-            _LOGGER.debug("The response was: %s", req.text)
+            _LOGGER.debug("An unhandled error occurred fetching data for %s", email)
+            _LOGGER.debug("The response was: %s", content)
             _LOGGER.error(
                 "Failed fetching data for %s (HTTP Status_code = %d)",
-                self._email,
-                req.status_code,
+                email,
+                status,
             )
+            self._serve_stale(data, email)
+
+    def _serve_stale(self, data, email):
+        """Fall back to cached data of any age after a failed fetch."""
+        if email in data:
+            return
+        if (cached := self._cache_get(email)) is not None:
+            _LOGGER.debug("Serving stale cached data for %s", email)
+            data[email] = cached